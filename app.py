@@ -1,14 +1,23 @@
 import os
-import pandas as pd
+import numpy as np
 import streamlit as st
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
+import requests
+import orjson
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+from geopy.adapters import RequestsAdapter
+from geopy.extra.rate_limiter import RateLimiter
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import math
-import time
 import re
+import io
+import unicodedata
+import csv
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, lru_cache
+from bisect import bisect_left
 
 # ページ設定
 st.set_page_config(
@@ -20,26 +29,86 @@ st.set_page_config(
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+# SerpAPIのエンドポイントと同時リクエスト数の上限
+SERPAPI_SEARCH_URL = "https://serpapi.com/search.json"
+SERPAPI_MAX_CONCURRENCY = 8
+# CSVの一括検索で同時に実行する件数
+CSV_SEARCH_CONCURRENCY = 5
+# CSVから電話番号取得の結果の列（表示・CSV出力の順序）
+CSV_RESULT_COLUMNS = [
+    '屋号（入力値）', '取得店舗名', '電話番号', '住所', '緯度', '経度',
+    '評価', 'レビュー数', '信頼度', 'エラー', '距離（m）'
+]
+# SerpAPIの検索結果のキャッシュ期間（秒）
+SERPAPI_CACHE_TTL = 48 * 3600
+# ダウンロード用CSVのキャッシュ期間（秒）と件数の上限（同じ結果を再実行のたびに変換しないためのもの）
+CSV_DOWNLOAD_CACHE_TTL = 600
+CSV_DOWNLOAD_CACHE_MAX_ENTRIES = 32
+# SerpAPIの検索結果のキャッシュ件数の上限（1件 = 1リクエスト分。超えたら古いものから破棄）
+SERPAPI_CACHE_MAX_ENTRIES = 2000
+# テーブル表示で最初に描画する最大行数
+SHOW_LIMIT = 500
+
+# 日本の電話番号フォーマットを網羅した正規表現
+_PHONE_RE = re.compile(
+    r'0120-\d{3}-\d{3}'             # フリーダイヤル 0120
+    r'|0800-\d{3}-\d{4}'            # フリーダイヤル 0800
+    r'|0\d{1,3}-\d{2,4}-\d{3,4}'    # 一般固定電話（市外局番付き）
+    r'|\(\d{2,4}\)\d{3,4}-\d{3,4}'  # (03)1234-5678 形式
+)
+# 検索結果に項目がない場合に使う共有の空dict（読み取り専用として扱う）
+_EMPTY = {}
+# 屋号（店名）の列を自動検出するための列名パターン
+_COL_PAT = re.compile(r'店名|屋号|名前|name|title|店舗名|名称', re.IGNORECASE)
+
 # APIキーをセッションステートで管理（初期値は環境変数から取得）
 if 'api_key' not in st.session_state:
     st.session_state.api_key = os.getenv('SERPAPI_KEY') or os.getenv('SERP_API_KEY') or ""
 
 api_key = st.session_state.api_key
 
+# ジオコーディング用クライアント（HTTPセッションを再実行・セッション間で使い回す）
+@st.cache_resource
+def _geolocator():
+    """共有の Nominatim クライアントを返す"""
+    return Nominatim(user_agent="phone_number_app", adapter_factory=RequestsAdapter)
+
+# キャッシュのキーに使うため住所・地名の表記ゆれを正規化する関数
+def _normalize_address(address):
+    """全角英数字・空白の揺れや大文字小文字を揃える"""
+    return " ".join(unicodedata.normalize("NFKC", address).split()).lower()
+
+# 住所・地名から座標を取得する関数（ディスクに永続化し、再起動後も再利用する）
+@st.cache_data(persist="disk", max_entries=10000, show_spinner=False)
+def _geocode_address(address, _geocode):
+    """
+    住所・地名から座標を取得する関数
+
+    見つからない場合は None を返す。通信エラーは例外のまま送出し、キャッシュしない。
+    """
+    location = _geocode(address)
+    if location:
+        return {
+            'latitude': location.latitude,
+            'longitude': location.longitude,
+            'address': location.address
+        }
+    return None
+
+def _geocode_address_or_none(address, geocode):
+    """_geocode_address のエラーを無視して None を返す（絞り込み時のフォールバック用）"""
+    try:
+        return _geocode_address(_normalize_address(address), geocode)
+    except Exception:
+        return None
+
 # 地名から座標を取得する関数
-@st.cache_data(ttl=3600)  # 1時間キャッシュ
 def get_coordinates_from_address(address):
     """地名から緯度・経度を取得する関数"""
     try:
-        geolocator = Nominatim(user_agent="phone_number_app")
-        location = geolocator.geocode(address, timeout=10)
+        location = _geocode_address(_normalize_address(address), partial(_geolocator().geocode, timeout=10))
         if location:
-            return {
-                'latitude': location.latitude,
-                'longitude': location.longitude,
-                'address': location.address,
-                'success': True
-            }
+            return {**location, 'success': True}
         else:
             return {'success': False, 'error': '場所が見つかりませんでした'}
     except (GeocoderTimedOut, GeocoderServiceError) as e:
@@ -47,68 +116,264 @@ def get_coordinates_from_address(address):
     except Exception as e:
         return {'success': False, 'error': f'エラー: {str(e)}'}
 
+# 半径（メートル）の区切りと対応するズームレベル（約500m→16, 約1km→15, ... 20km超→10）
+_RADIUS_BINS = (500, 1000, 2000, 5000, 10000, 20000)
+_ZOOMS = (16, 15, 14, 13, 12, 11, 10)
+
 # 半径（メートル）から適切なズームレベルを計算する関数
+@lru_cache(maxsize=64)
 def radius_to_zoom_level(radius_meters):
     """半径（メートル）から適切なズームレベルを計算"""
-    if radius_meters <= 500:
-        return 16
-    elif radius_meters <= 1000:
-        return 15
-    elif radius_meters <= 2000:
-        return 14
-    elif radius_meters <= 5000:
-        return 13
-    elif radius_meters <= 10000:
-        return 12
-    elif radius_meters <= 20000:
-        return 11
-    else:
-        return 10
+    # 区切りの値ちょうどは小さい側に含める（例: 500m → 16）ため bisect_left を使う
+    return _ZOOMS[bisect_left(_RADIUS_BINS, radius_meters)]
 
-# 半径内をカバーするために複数の座標点を生成する関数
-def generate_search_points(center_lat, center_lon, radius_meters):
-    """指定された半径をカバーするために複数の検索地点を生成"""
+# WGS84楕円体の長半径（メートル）と離心率の2乗
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+
+# 半径内をカバーするグリッドの座標を計算する関数
+def _grid_points(center_lat, center_lon, radius_meters):
+    """
+    中心を除くグリッド上の検索地点を計算する
+
+    Returns:
+        np.ndarray: (N, 2) の float64 配列（各行が 緯度, 経度）
+    """
+    cos_center = math.cos(math.radians(center_lat))
     lat_degree_per_meter = 1 / 111000
-    lon_degree_per_meter = 1 / (111000 * math.cos(math.radians(center_lat)))
+    lon_degree_per_meter = 1 / (111000 * cos_center)
     
     grid_spacing = radius_meters * 0.4
     grid_size = int(radius_meters * 2 / grid_spacing) + 1
     
-    search_points = []
+    # 1マスあたりの緯度・経度の変化量（スカラーで1回だけ計算）
+    lat_step = grid_spacing * lat_degree_per_meter
+    lon_step = grid_spacing * lon_degree_per_meter
+    
+    # グリッド全体を一括で計算する
+    steps = np.arange(-grid_size, grid_size + 1)
+    i, j = np.meshgrid(steps, steps, indexing='ij')
+    lats = center_lat + i * lat_step
+    lons = center_lon + j * lon_step
     
-    search_points.append({
+    # 中心からの実際の距離（WGS84楕円体、各地点との中間緯度の曲率半径で近似）。
+    # 1度=111kmの近似とはずれるため、境界上の地点が入るかどうかは緯度によって変わる
+    mid_phi = np.radians((lats + center_lat) / 2)
+    w = np.sqrt(1 - _WGS84_E2 * np.sin(mid_phi) ** 2)
+    meridian_radius = _WGS84_A * (1 - _WGS84_E2) / w ** 3
+    normal_radius = _WGS84_A / w
+    distance = np.hypot(
+        meridian_radius * np.radians(lats - center_lat),
+        normal_radius * np.cos(mid_phi) * np.radians(lons - center_lon)
+    )
+    
+    # 中心点は呼び出し側で追加するため除外
+    mask = (distance <= radius_meters * 1.2) & ((i != 0) | (j != 0))
+    return np.stack([lats[mask], lons[mask]], axis=1)
+
+# 半径内をカバーするために複数の座標点を生成する関数
+def generate_search_points(center_lat, center_lon, radius_meters):
+    """指定された半径をカバーするために複数の検索地点を生成"""
+    zoom = radius_to_zoom_level(radius_meters)
+    
+    search_points = [{
         'lat': center_lat,
         'lon': center_lon,
-        'zoom': radius_to_zoom_level(radius_meters)
-    })
+        'zoom': zoom
+    }]
     
-    for i in range(-grid_size, grid_size + 1):
-        for j in range(-grid_size, grid_size + 1):
-            if i == 0 and j == 0:
-                continue
-            
-            lat_offset = i * grid_spacing * lat_degree_per_meter
-            lon_offset = j * grid_spacing * lon_degree_per_meter
-            
-            new_lat = center_lat + lat_offset
-            new_lon = center_lon + lon_offset
-            
-            distance = geodesic((center_lat, center_lon), (new_lat, new_lon)).meters
-            
-            if distance <= radius_meters * 1.2:
-                search_points.append({
-                    'lat': new_lat,
-                    'lon': new_lon,
-                    'zoom': radius_to_zoom_level(radius_meters)
-                })
+    search_points.extend([
+        {
+            'lat': new_lat,
+            'lon': new_lon,
+            'zoom': zoom
+        }
+        for new_lat, new_lon in _grid_points(center_lat, center_lon, radius_meters).tolist()
+    ])
     
     return search_points
 
-# 座標間の距離を計算する関数
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """2点間の距離をメートルで返す"""
-    return geodesic((lat1, lon1), (lat2, lon2)).meters
+# 地球の半径（メートル）
+EARTH_RADIUS_M = 6371000
+
+# 1点から複数地点への距離をまとめて計算する関数
+def haversine_m_vec(lat1, lon1, lats, lons):
+    """基準点から各地点までの距離（メートル）を np.ndarray で返す（座標が NaN の地点は NaN）"""
+    phi1 = math.radians(lat1)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlam = np.radians(np.asarray(lons, dtype=float) - lon1)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+# 距離の配列を表示用の文字列（メートル単位の整数）にまとめて変換する関数
+def format_distances(distances):
+    """距離（メートル）の配列を文字列の配列に変換する（NaN は空欄）"""
+    distances = np.asarray(distances, dtype=float)
+    return np.where(np.isnan(distances), '', np.char.mod('%.0f', distances))
+
 
+# 検索結果が0件のときにSerpAPIが返すエラーメッセージ（エラーではなく「結果なし」として扱う）
+_SERPAPI_NO_RESULTS = "Google hasn't returned any results for this query."
+
+
+def _check_serpapi_results(results):
+    """
+    SerpAPIのレスポンスにエラーが含まれていれば例外を送出する
+
+    例外にすることで、キャッシュ関数がエラー応答を結果として保存しないようにする。
+    """
+    error = results.get('error')
+    if error and error != _SERPAPI_NO_RESULTS:
+        raise RuntimeError(f"SerpAPIエラー: {error}")
+    return results
+
+
+def _parse_serpapi_response(status, body):
+    """
+    SerpAPIのレスポンス本文をdictにして返す
+
+    4xxでもSerpAPIはJSONでエラー内容を返すため、先に本文のerrorを確認する。
+    例外のメッセージにはAPIキーを含むURLを入れない（画面やCSVにそのまま表示されるため）。
+    """
+    try:
+        results = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        results = None
+    if isinstance(results, dict):
+        _check_serpapi_results(results)
+    if status >= 400 or not isinstance(results, dict):
+        raise RuntimeError(f"SerpAPI HTTP {status}")
+    return results
+
+
+@st.cache_resource
+def _serpapi_session():
+    """SerpAPI用の共有HTTPセッションを返す（スレッド間でコネクションを使い回す）"""
+    return requests.Session()
+
+
+def _request_serpapi(params, api_key):
+    """SerpAPIにリクエストを送り、結果のdictを返す（HTTPエラー・APIエラーは例外を送出）"""
+    try:
+        response = _serpapi_session().get(SERPAPI_SEARCH_URL, params={**params, "api_key": api_key}, timeout=60)
+    except requests.RequestException as e:
+        # requestsの例外メッセージにはAPIキーを含むURLが入るため、種類だけを伝える
+        raise RuntimeError(f"SerpAPI通信エラー: {type(e).__name__}") from None
+    return _parse_serpapi_response(response.status_code, response.content)
+
+
+# 店舗ごとの検索で毎回同じキーをハッシュしないようメモ化する
+@lru_cache(maxsize=16)
+def fingerprint_api_key(api_key):
+    """キャッシュのキーに使うAPIキーのハッシュ値を返す（キー自体はキャッシュに含めない）"""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+@st.cache_data(ttl=SERPAPI_CACHE_TTL, max_entries=SERPAPI_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_serpapi_dict(params, _api_key, api_key_fingerprint):
+    """
+    SerpAPIの検索結果（dict）を取得する関数
+
+    結果は (params, api_key_fingerprint) をキーに48時間キャッシュされる。
+    HTTPエラーやSerpAPIのエラー応答は例外として送出されるため、キャッシュされない。
+
+    Args:
+        params: api_key を除いた検索パラメータ
+        _api_key: SerpAPIキー（キャッシュのキーには含めない）
+        api_key_fingerprint: APIキーのハッシュ値
+    """
+    return _request_serpapi(params, _api_key)
+
+
+@st.cache_data(ttl=SERPAPI_CACHE_TTL, max_entries=SERPAPI_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_local_page(query, location_str, start, _api_key, api_key_fingerprint):
+    """
+    1地点・1ページ分のGoogle Maps検索結果（local_results）を取得する関数
+
+    結果は (query, location_str, start, api_key_fingerprint) をキーに48時間キャッシュされる。
+    キャッシュにはレスポンス全体ではなく、結果の統合で使う local_results だけを保存する。
+    ページ単位でキャッシュするため、一部のページが失敗しても成功したページは再取得しない。
+    HTTPエラーやSerpAPIのエラー応答は例外として送出されるため、キャッシュされない。
+
+    Args:
+        query: 検索キーワード
+        location_str: 検索地点（"@緯度,経度,ズームz"）
+        start: 取得開始位置（0, 20, 40, ...）
+        _api_key: SerpAPIキー（キャッシュのキーには含めない）
+        api_key_fingerprint: APIキーのハッシュ値
+
+    Returns:
+        list: 店舗（dict）のリスト
+    """
+    params = {
+        "engine": "google_maps",
+        "q": query,
+        "ll": location_str
+    }
+    if start:
+        params["start"] = start
+    return _request_serpapi(params, _api_key).get('local_results') or []
+
+
+async def _fetch_page(semaphore, query, location_str, start, api_key):
+    """1ページ分の検索をスレッドで実行する（キャッシュは fetch_local_page が持つ）"""
+    async with semaphore:
+        return await asyncio.to_thread(fetch_local_page, query, location_str, start, api_key, fingerprint_api_key(api_key))
+
+
+async def _fetch_all_locations(query, location_strs, api_key, max_pages, max_places, on_page=None):
+    """
+    全地点の検索をページ単位の波に分けて並列に実行する
+
+    1ページ目は全地点まとめて取得し、次のページは直前のページが20件あった地点だけ取得する。
+    重複を除いた店舗数が max_places に達したら、それ以降のページは取得しない。
+    取得に失敗したページはその地点の終端として扱い、他の地点の結果はそのまま使う。
+    on_page を渡すと、1ページ取得するごとに (ページ番号, その波での完了数, その波の地点数) で呼ばれる。
+
+    Returns:
+        tuple: (地点ごとの取得できたページ（店舗のリスト）のリスト, 失敗した地点の番号→エラーメッセージのdict)
+    """
+    semaphore = asyncio.Semaphore(SERPAPI_MAX_CONCURRENCY)
+    location_pages = [[] for _ in location_strs]
+    errors = {}
+    pending = list(range(len(location_strs)))
+    seen = set()
+    for page in range(max_pages):
+        if not pending or len(seen) >= max_places:
+            break
+        done = 0
+        
+        async def fetch(loc_idx):
+            nonlocal done
+            try:
+                return await _fetch_page(semaphore, query, location_strs[loc_idx], page * 20, api_key)
+            finally:
+                done += 1
+                if on_page:
+                    on_page(page, done, len(pending))
+        
+        responses = await asyncio.gather(*[fetch(loc_idx) for loc_idx in pending], return_exceptions=True)
+        
+        next_pending = []
+        for loc_idx, page_results in zip(pending, responses):
+            if isinstance(page_results, BaseException):
+                errors[loc_idx] = str(page_results)
+                continue
+            location_pages[loc_idx].append(page_results)
+            seen.update((place.get('title', ''), place.get('address', '')) for place in page_results)
+            # 20件未満のページが最終ページ
+            if len(page_results) >= 20:
+                next_pending.append(loc_idx)
+        pending = next_pending
+    
+    return location_pages, errors
+
+
+# 閉店・廃業を示す語（スコアを大幅減点）
+_CLOSED_WORDS = ('閉店', '廃業', '跡地', '移転')
+# 支店・本店を示す語（スコアを若干減点）
+_SUFFIX_SET = ('支店', '本店', '店')
 
 # ▼▼▼ 精度向上: score_place に店名一致度・閉店判定・レビュー数ボーナスを追加 ▼▼▼
 def score_place(place, query=""):
@@ -158,11 +423,11 @@ def score_place(place, query=""):
             score -= 20        # 全く一致しない → 大幅減点
 
     # 閉店・廃業ワードは大幅減点
-    if any(x in title for x in ['閉店', '廃業', '跡地', '移転']):
+    if any(x in title for x in _CLOSED_WORDS):
         score -= 80
 
     # 支店・本店は若干減点（元の挙動を維持）
-    if any(x in title for x in ['支店', '本店', '店']):
+    if any(x in title for x in _SUFFIX_SET):
         score -= 5
 
     return score
@@ -198,27 +463,16 @@ def search_phone_from_organic(store_name, api_key):
         params = {
             "engine": "google",
             "q": f"{store_name} 公式 電話番号",
-            "api_key": api_key,
             "num": 5
         }
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = fetch_serpapi_dict(params, api_key, fingerprint_api_key(api_key))
         
-        # ▼ 精度向上: 日本の電話番号フォーマットを網羅した正規表現
-        phone_patterns = [
-            r'0120-\d{3}-\d{3}',            # フリーダイヤル 0120
-            r'0800-\d{3}-\d{4}',             # フリーダイヤル 0800
-            r'0\d{1,3}-\d{2,4}-\d{3,4}',    # 一般固定電話（市外局番付き）
-            r'\(\d{2,4}\)\d{3,4}-\d{3,4}',  # (03)1234-5678 形式
-        ]
-        for r in results.get("organic_results", []):
-            snippet = r.get("snippet", "")
-            for pattern in phone_patterns:
-                match = re.search(pattern, snippet)
-                if match:
-                    return match.group()
-        # ▲ 精度向上ここまで
+        # 全スニペットを改行で連結し、最初に見つかった電話番号を返す
+        snippets = "\n".join(r.get("snippet", "") for r in results.get("organic_results", []))
+        match = _PHONE_RE.search(snippets)
+        if match:
+            return match.group()
 
         return ""
     except Exception as e:
@@ -263,7 +517,6 @@ def search_store_by_name(store_name, location_str=None, api_key=None, location_h
         params = {
             "engine": "google_maps",
             "q": query,
-            "api_key": api_key,
             "type": "search",  # 検索モードを明示
             "hl": "ja",        # 日本語で結果を取得
             "gl": "jp",        # 日本の検索結果に絞る
@@ -274,28 +527,23 @@ def search_store_by_name(store_name, location_str=None, api_key=None, location_h
         if location_str:
             params["ll"] = location_str
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = fetch_serpapi_dict(params, api_key, fingerprint_api_key(api_key))
         
         if results and 'local_results' in results:
             local_results = results.get('local_results', [])
             if local_results:
                 # ▼ 精度向上: スコアリング呼び出しにqueryを渡す
-                if len(local_results) > 1:
-                    scored_places = [(place, score_place(place, query)) for place in local_results]
-                    scored_places.sort(key=lambda x: x[1], reverse=True)
-                    place = scored_places[0][0]
-                else:
-                    place = local_results[0]
+                # 最高スコアの1件だけが必要なのでソートせず max で選ぶ（同点なら先頭を優先）
+                place = max(local_results, key=lambda p: score_place(p, query))
                 # ▲ 精度向上ここまで
 
                 title = place.get('title', '')
                 phone = place.get('phone') or place.get('formatted_phone_number') or place.get('電話', '')
                 address = place.get('address') or place.get('住所', '')
                 
-                gps = place.get('gps_coordinates', {})
-                latitude = gps.get('latitude') if gps else None
-                longitude = gps.get('longitude') if gps else None
+                gps = place.get('gps_coordinates') or _EMPTY
+                latitude = gps.get('latitude')
+                longitude = gps.get('longitude')
                 
                 result = {
                     'success': True,
@@ -354,6 +602,132 @@ def search_store_by_name(store_name, location_str=None, api_key=None, location_h
             '信頼度': 'Low'
         }
 
+async def search_store_by_name_async(semaphore, store_name, location_str=None, api_key=None, location_hint=None):
+    """
+    search_store_by_name の非同期版（同時実行数は semaphore で制限）
+
+    SerpAPIの取得結果のキャッシュを共有するため、同期版をスレッドで実行する。
+    """
+    async with semaphore:
+        return await asyncio.to_thread(search_store_by_name, store_name, location_str, api_key, location_hint)
+
+
+async def search_stores_by_name(store_names, location_str=None, api_key=None, location_hint=None, on_result=None):
+    """
+    複数の屋号（店名）を並列に検索する関数
+
+    Args:
+        store_names: 検索する店舗名のリスト
+        location_str: 検索場所（例: "@35.6762,139.6503,14z" または None）
+        api_key: SerpAPIキー
+        location_hint: 地名のヒント
+        on_result: 1件完了するごとに (完了件数, 店舗名) で呼ばれる関数
+
+    Returns:
+        list: store_names と同じ順序の検索結果（dict）のリスト
+    """
+    semaphore = asyncio.Semaphore(CSV_SEARCH_CONCURRENCY)
+    done = 0
+
+    async def search(store_name):
+        nonlocal done
+        result = await search_store_by_name_async(semaphore, store_name, location_str, api_key, location_hint)
+        done += 1
+        if on_result:
+            on_result(done, store_name)
+        return result
+
+    return await asyncio.gather(*[search(store_name) for store_name in store_names])
+
+# テイクアウト可能な店舗かを判定する関数
+def has_takeout(place):
+    """検索結果のservice_optionsにテイクアウト可の記載があればTrueを返す"""
+    service_options = place.get('service_options') or _EMPTY
+    return bool(service_options.get('takeout') or service_options.get('テイクアウト'))
+
+
+# 結果テーブルを表示する関数（件数が多い場合は先頭SHOW_LIMIT件のみ描画する）
+@st.fragment
+def show_result_table(data, row_count, key):
+    """
+    件数がSHOW_LIMITを超える場合は先頭だけを表示し、「全件表示」で全件に切り替える
+    フラグメント内で再実行されるため、切り替えても検索結果は消えない
+    
+    Args:
+        data: 列名→値リストのdict、またはDataFrame
+        row_count: 行数
+        key: チェックボックスのキー
+    """
+    if row_count > SHOW_LIMIT and not st.checkbox("全件表示", key=key):
+        if isinstance(data, dict):
+            data = {column: values[:SHOW_LIMIT] for column, values in data.items()}
+        else:
+            data = data.head(SHOW_LIMIT)
+        st.caption(f"先頭{SHOW_LIMIT}件を表示中（{row_count - SHOW_LIMIT}件省略）")
+    st.dataframe(data, use_container_width=True, hide_index=True)
+
+
+# 信頼度ごとの表示用アイコン
+_CONFIDENCE_EMOJI = {
+    'Very High': '🟢',
+    'High': '🟡',
+    'Mid': '🟠',
+    'Low': '🔴'
+}
+
+
+def _iter_place_markdown(columns):
+    """通常検索の結果（列ごとのリスト）から、リスト表示用のMarkdownを1店舗ずつ返す"""
+    rows = zip(columns['店舗名'], columns['電話番号'], columns['住所'], columns['評価'], columns['レビュー数'])
+    for index, (title, phone, address, rating, review_count) in enumerate(rows, 1):
+        lines = [
+            f"### {index}. {title}",
+            f"📞 **電話番号:** {phone}",
+            f"📍 **住所:** {address}",
+        ]
+        if rating != '評価なし':
+            lines.append(f"⭐ **評価:** {rating} ({review_count}件)")
+        yield "\n\n".join(lines)
+
+
+def _iter_csv_result_markdown(results_list):
+    """CSVから取得した結果から、リスト表示用のMarkdownを1行ずつ返す"""
+    for index, row in enumerate(results_list, 1):
+        lines = [f"### {index}. {row['屋号（入力値）']}"]
+        if row['取得店舗名']:
+            lines.append(f"**取得店舗名:** {row['取得店舗名']}")
+        if row['電話番号']:
+            lines.append(f"📞 **電話番号:** {row['電話番号']}")
+        if row['住所']:
+            lines.append(f"📍 **住所:** {row['住所']}")
+        if row.get('距離（m）'):
+            lines.append(f"📏 **距離:** {row['距離（m）']}m")
+        confidence = row.get('信頼度', 'Low')
+        lines.append(f"{_CONFIDENCE_EMOJI.get(confidence, '⚪')} **信頼度:** {confidence}")
+        if row['エラー']:
+            lines.append(f"⚠️ **エラー:** {row['エラー']}")
+        yield "\n\n".join(lines)
+
+
+@st.cache_data(ttl=CSV_DOWNLOAD_CACHE_TTL, max_entries=CSV_DOWNLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def _columns_to_csv_bytes(columns):
+    """列ごとのリスト（dict）をBOM付きUTF-8のCSVに変換する（再実行時はキャッシュを返す）"""
+    buf = io.BytesIO()
+    # 文字列を経由せず、BOM付きUTF-8でバイト列に直接書き込む
+    with io.TextIOWrapper(buf, encoding='utf-8-sig', newline='', write_through=True) as text:
+        writer = csv.writer(text)
+        writer.writerow(columns.keys())
+        writer.writerows(zip(*columns.values()))
+        return buf.getvalue()
+
+
+@st.cache_data(ttl=CSV_DOWNLOAD_CACHE_TTL, max_entries=CSV_DOWNLOAD_CACHE_MAX_ENTRIES, show_spinner=False)
+def _to_csv_bytes(df):
+    """DataFrameをBOM付きUTF-8のCSVに変換する（再実行時はキャッシュを返す）"""
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding='utf-8-sig')
+    return buf.getvalue()
+
 # タイトルと説明
 st.title("📞 店舗電話番号抽出アプリ")
 st.markdown("SerpAPIを使用してGoogle Mapsから店舗を検索し、電話番号をリスト化します。")
@@ -383,6 +757,12 @@ with st.sidebar:
     else:
         st.success("✅ APIキーが設定されています")
     
+    st.checkbox(
+        "🐞 デバッグ情報を表示",
+        key="debug_mode",
+        help="検索結果が0件のときに、SerpAPIのレスポンスの一部を表示します"
+    )
+    
     st.markdown("---")
     st.markdown("### 使い方")
     st.markdown("""
@@ -694,9 +1074,9 @@ if location_input_method == "地名から検索（推奨）":
             expand_text = "（複数地点検索）" if expand_search else ""
             with st.spinner(f"「{search_query}」を検索しています{filter_text}{radius_text}{expand_text}..."):
                 try:
-                    phone_numbers = []
+                    # 結果は列ごとのリストで保持する（距離が計算できない行は空欄）
+                    cols = {'店舗名': [], '電話番号': [], '住所': [], '評価': [], 'レビュー数': [], '距離（m）': []}
                     all_places = []
-                    page = 0
                     max_pages = 6
                     
                     progress_bar = st.progress(0)
@@ -732,56 +1112,45 @@ if location_input_method == "地名から検索（推奨）":
                             'zoom': st.session_state.zoom
                         })
                     
-                    total_locations = len(search_locations)
-                    for loc_idx, loc in enumerate(search_locations):
-                        location_str = f"@{loc['lat']},{loc['lon']},{loc['zoom']}z"
-                        
+                    # 座標を小数点以下3桁（約100m）に丸めてキャッシュを効きやすくし、重複地点もまとめる
+                    location_strs = tuple(dict.fromkeys(
+                        f"@{round(loc['lat'], 3)},{round(loc['lon'], 3)},{loc['zoom']}z" for loc in search_locations
+                    ))
+                    total_locations = len(location_strs)
+                    
+                    # 通信が完了するたびに進捗を更新する（ページ数は結果次第のため、最大ページ数に対する割合で表示）
+                    def update_progress(page, done, wave_size):
+                        progress_bar.progress(min(1.0, (page + done / wave_size) / max_pages))
                         if total_locations > 1:
-                            status_text.text(f"地点 {loc_idx + 1}/{total_locations} を検索中... ({len(all_places)}件取得済み)")
-                            progress_bar.progress(loc_idx / total_locations)
-                        
-                        params = {
-                            "engine": "google_maps",
-                            "q": search_query,
-                            "ll": location_str,
-                            "api_key": api_key
-                        }
-                        
-                        search = GoogleSearch(params)
-                        results = search.get_dict()
+                            status_text.text(f"ページ {page + 1} を取得中... ({done}/{wave_size}地点)")
+                        else:
+                            status_text.text(f"ページ {page + 1} を取得中...")
                     
-                        page = 0
-                        while page < max_pages:
-                            page += 1
-                            if total_locations > 1:
-                                status_text.text(f"地点 {loc_idx + 1}/{total_locations} - ページ {page} を取得中... ({len(all_places)}件取得済み)")
-                            else:
-                                status_text.text(f"ページ {page} を取得中... ({len(all_places)}件取得済み)")
-                            progress_bar.progress((loc_idx + page / max_pages) / total_locations)
-                            
-                            if not results or 'local_results' not in results:
-                                break
-                            
-                            page_results = results.get('local_results', [])
-                            
+                    location_pages, failed_locations = asyncio.run(_fetch_all_locations(
+                        search_query, location_strs, api_key, max_pages, max_results * 2, on_page=update_progress
+                    ))
+                    if failed_locations:
+                        st.warning(
+                            f"⚠️ {len(failed_locations)}/{total_locations}地点の検索でエラーが発生したため、"
+                            f"それらの地点の結果は一部または全部が含まれていません（{next(iter(failed_locations.values()))}）"
+                        )
+                    
+                    seen = set()
+                    for pages in location_pages:
+                        for page_results in pages:
                             if not page_results:
                                 break
                             
-                            existing_places = {(p.get('title', ''), p.get('address', '')) for p in all_places}
                             for place in page_results:
                                 place_key = (place.get('title', ''), place.get('address', ''))
-                                if place_key not in existing_places:
-                                    all_places.append(place)
-                                    existing_places.add(place_key)
+                                if place_key in seen:
+                                    continue
+                                seen.add(place_key)
+                                all_places.append(place)
                             
+                            # 20件未満のページが最終ページ
                             if len(page_results) < 20:
                                 break
-                            
-                            try:
-                                search = search.get_next()
-                                results = search.get_dict()
-                            except Exception as e:
-                                break
                         
                         if len(all_places) >= max_results * 2:
                             break
@@ -789,115 +1158,103 @@ if location_input_method == "地名から検索（推奨）":
                     progress_bar.progress(1.0)
                     status_text.text("結果をフィルタリング中...")
                     
-                    for place in all_places:
-                        if use_radius and radius_meters:
-                            place_lat = None
-                            place_lon = None
-                            
-                            gps = place.get('gps_coordinates', {})
-                            if gps:
-                                place_lat = gps.get('latitude')
-                                place_lon = gps.get('longitude')
-                            
-                            if place_lat is None or place_lon is None:
-                                address = place.get('address') or place.get('住所', '')
-                                if address:
-                                    try:
-                                        geolocator = Nominatim(user_agent="phone_number_app")
-                                        location = geolocator.geocode(address, timeout=5)
-                                        if location:
-                                            place_lat = location.latitude
-                                            place_lon = location.longitude
-                                    except:
-                                        pass
-                            
-                            if place_lat is not None and place_lon is not None:
-                                distance = calculate_distance(center_lat, center_lon, place_lat, place_lon)
-                                if distance > radius_meters:
-                                    continue
-                        
-                        if filter_takeout_only:
-                            service_options = place.get('service_options', {})
-                            takeout = service_options.get('takeout') or service_options.get('テイクアウト')
-                            if not takeout:
-                                continue
+                    distances = np.full(len(all_places), np.nan)
+                    keep = np.ones(len(all_places), dtype=bool)
+                    if use_radius and radius_meters and all_places:
+                        place_lats = np.array([(p.get('gps_coordinates') or _EMPTY).get('latitude', np.nan) for p in all_places], dtype=float)
+                        place_lons = np.array([(p.get('gps_coordinates') or _EMPTY).get('longitude', np.nan) for p in all_places], dtype=float)
                         
-                        if len(phone_numbers) >= max_results:
-                            break
-                            
-                        title = place.get('title', 'タイトル不明')
-                        phone = place.get('phone') or place.get('電話', '電話番号なし')
-                        address = place.get('address') or place.get('住所', '住所不明')
-                        rating = place.get('rating', '評価なし')
-                        reviews = place.get('reviews', 'レビュー数なし')
+                        # GPS座標がない店舗は住所からジオコーディング（並列実行）
+                        missing_idx = []
+                        missing_addr = []
+                        for idx in np.flatnonzero(np.isnan(place_lats) | np.isnan(place_lons)):
+                            address = all_places[idx].get('address') or all_places[idx].get('住所', '')
+                            if address:
+                                missing_idx.append(idx)
+                                missing_addr.append(address)
                         
-                        distance_info = {}
-                        if use_radius and radius_meters:
-                            gps = place.get('gps_coordinates', {})
-                            if gps and gps.get('latitude') and gps.get('longitude'):
-                                distance = calculate_distance(center_lat, center_lon, gps['latitude'], gps['longitude'])
-                                distance_info['距離（m）'] = f"{distance:.0f}"
+                        if missing_addr:
+                            # 同じ住所は1回だけ問い合わせる
+                            unique_addresses = list(dict.fromkeys(missing_addr))
+                            status_text.text(f"住所から座標を取得中... ({len(unique_addresses)}件)")
+                            rate_limited_geocode = RateLimiter(partial(_geolocator().geocode, timeout=5), min_delay_seconds=1.0, swallow_exceptions=False)
+                            with ThreadPoolExecutor(max_workers=5) as executor:
+                                coords = dict(zip(unique_addresses, executor.map(partial(_geocode_address_or_none, geocode=rate_limited_geocode), unique_addresses)))
+                            for idx, address in zip(missing_idx, missing_addr):
+                                location = coords[address]
+                                if location:
+                                    place_lats[idx] = location['latitude']
+                                    place_lons[idx] = location['longitude']
                         
-                        phone_numbers.append({
-                            '店舗名': title,
-                            '電話番号': phone,
-                            '住所': address,
-                            '評価': rating,
-                            'レビュー数': reviews,
-                            **distance_info
-                        })
+                        # 中心からの距離を全店舗分まとめて計算
+                        distances = haversine_m_vec(center_lat, center_lon, place_lats, place_lons)
+                        # 座標が取得できなかった店舗（NaN）は半径で除外しない
+                        keep = ~(distances > radius_meters)
+                    
+                    distance_texts = format_distances(distances).tolist()
+                    # 絞り込みはループの外で済ませ、結果の詰め込みは分岐なしで行う
+                    selected = np.flatnonzero(keep).tolist()
+                    if filter_takeout_only:
+                        selected = [idx for idx in selected if has_takeout(all_places[idx])]
+                    for idx in selected[:max_results]:
+                        place = all_places[idx]
+                        cols['店舗名'].append(place.get('title', 'タイトル不明'))
+                        cols['電話番号'].append(place.get('phone') or place.get('電話', '電話番号なし'))
+                        cols['住所'].append(place.get('address') or place.get('住所', '住所不明'))
+                        cols['評価'].append(place.get('rating', '評価なし'))
+                        cols['レビュー数'].append(place.get('reviews', 'レビュー数なし'))
+                        cols['距離（m）'].append(distance_texts[idx])
                     
                     progress_bar.progress(1.0)
                     status_text.empty()
                     
-                    if phone_numbers:
-                        st.success(f"✅ {len(phone_numbers)}件の店舗が見つかりました！")
+                    if cols['店舗名']:
+                        result_count = len(cols['店舗名'])
+                        # 半径指定なしの検索では距離列を出さない
+                        if not (use_radius and radius_meters):
+                            del cols['距離（m）']
                         
-                        df = pd.DataFrame(phone_numbers)
+                        st.success(f"✅ {result_count}件の店舗が見つかりました！")
                         
                         tab1, tab2, tab3 = st.tabs(["📊 テーブル表示", "📋 リスト表示", "📥 CSVダウンロード"])
                         
                         with tab1:
-                            st.dataframe(df, use_container_width=True, hide_index=True)
+                            show_result_table(cols, result_count, key="show_all_places")
                         
                         with tab2:
-                            for index, place in enumerate(phone_numbers, 1):
-                                with st.container():
-                                    col1, col2 = st.columns([3, 1])
-                                    with col1:
-                                        st.markdown(f"### {index}. {place['店舗名']}")
-                                        st.markdown(f"📞 **電話番号:** {place['電話番号']}")
-                                        st.markdown(f"📍 **住所:** {place['住所']}")
-                                        if place['評価'] != '評価なし':
-                                            st.markdown(f"⭐ **評価:** {place['評価']} ({place['レビュー数']}件)")
-                                    st.divider()
+                            # 行ごとに要素を出すと要素数だけ描画メッセージが増えるため、1つのMarkdownにまとめて描画する
+                            st.markdown("\n\n---\n\n".join(_iter_place_markdown(cols)))
                         
                         with tab3:
                             st.markdown("### CSVファイルをダウンロード")
-                            csv = df.to_csv(index=False, encoding='utf-8-sig')
+                            csv_bytes = _columns_to_csv_bytes(cols)
                             st.download_button(
                                 label="📥 CSVファイルをダウンロード",
-                                data=csv,
-                                file_name=f"phone_numbers_{search_query}_{len(phone_numbers)}件.csv",
+                                data=csv_bytes,
+                                file_name=f"phone_numbers_{search_query}_{result_count}件.csv",
                                 mime="text/csv",
                                 use_container_width=True
                             )
-                            st.markdown("#### プレビュー")
-                            st.dataframe(df, use_container_width=True, hide_index=True)
+                            st.caption("プレビュー (先頭20件)")
+                            st.table({column: values[:20] for column, values in cols.items()})
                         
                         with st.sidebar:
                             st.markdown("---")
-                            st.markdown(f"### 📞 電話番号リスト ({len(phone_numbers)}件)")
-                            for index, place in enumerate(phone_numbers[:20], 1):
-                                if place['電話番号'] != '電話番号なし':
-                                    st.markdown(f"{index}. {place['電話番号']}")
-                            if len(phone_numbers) > 20:
-                                st.caption(f"他 {len(phone_numbers) - 20} 件...")
+                            st.markdown(f"### 📞 電話番号リスト ({result_count}件)")
+                            for index, phone in enumerate(cols['電話番号'][:20], 1):
+                                if phone != '電話番号なし':
+                                    st.markdown(f"{index}. {phone}")
+                            if result_count > 20:
+                                st.caption(f"他 {result_count - 20} 件...")
                     
                     else:
                         st.warning("⚠️ 電話番号が見つかりませんでした。")
-                        if results:
-                            st.json(results)
+                        if st.session_state.get('debug_mode', False):
+                            with st.expander("🐞 デバッグ情報"):
+                                st.json({
+                                    'errors': list(failed_locations.values())[:3],
+                                    'local_results': next((pages[0] for pages in location_pages if pages), [])[:3]
+                                })
                             
                 except Exception as e:
                     st.error(f"❌ エラーが発生しました: {str(e)}")
@@ -915,11 +1272,23 @@ with tab_csv:
     )
     
     if uploaded_file is not None:
+        # pandas はファイル読み込み時にだけ必要なので、初回表示を軽くするためここで読み込む
+        import pandas as pd
+        
         try:
+            # 高速なエンジン（CSV: pyarrow, Excel: calamine）を優先し、使えない場合は標準のエンジンで読み込む
             if uploaded_file.name.endswith('.csv'):
-                df_uploaded = pd.read_csv(uploaded_file)
+                try:
+                    df_uploaded = pd.read_csv(uploaded_file, engine='pyarrow')
+                except (ImportError, ValueError):
+                    uploaded_file.seek(0)
+                    df_uploaded = pd.read_csv(uploaded_file)
             else:
-                df_uploaded = pd.read_excel(uploaded_file)
+                try:
+                    df_uploaded = pd.read_excel(uploaded_file, engine='calamine')
+                except (ImportError, ValueError):
+                    uploaded_file.seek(0)
+                    df_uploaded = pd.read_excel(uploaded_file)
             
             st.success(f"✅ ファイルを読み込みました（{len(df_uploaded)}行）")
             
@@ -929,12 +1298,7 @@ with tab_csv:
             st.markdown("#### 🔍 列の選択")
             columns = df_uploaded.columns.tolist()
             
-            auto_detected_col = None
-            for col in columns:
-                col_lower = col.lower()
-                if any(keyword in col_lower for keyword in ['店名', '屋号', '名前', 'name', 'title', '店舗名', '名称']):
-                    auto_detected_col = col
-                    break
+            auto_detected_col = next((col for col in columns if _COL_PAT.search(str(col))), None)
             
             store_name_col = st.selectbox(
                 "屋号（店名）の列を選択 *",
@@ -990,9 +1354,11 @@ with tab_csv:
                 if store_name_col not in df_uploaded.columns:
                     st.error("❌ 選択した列が存在しません")
                 else:
-                    store_names = df_uploaded[store_name_col].dropna().astype(str).tolist()
+                    # 前後の空白を除き、空の屋号は検索対象から外す
+                    store_names = df_uploaded[store_name_col].dropna().astype(str).str.strip().to_numpy(dtype=object)
+                    store_names = store_names[store_names != '']
                     
-                    if not store_names:
+                    if store_names.size == 0:
                         st.warning("⚠️ 屋号が含まれていません")
                     else:
                         # 検索場所を設定（元の挙動を維持）
@@ -1016,14 +1382,34 @@ with tab_csv:
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        for idx, store_name in enumerate(store_names):
-                            status_text.text(f"検索中: {idx + 1}/{len(store_names)} - {store_name}")
-                            progress_bar.progress((idx + 1) / len(store_names))
-                            
-                            # ▼ 精度向上: location_hint（地名）を渡す
-                            result = search_store_by_name(store_name, location_str_csv, api_key, location_hint=location_name)
-                            # ▲ 精度向上ここまで
-                            
+                        # 同じ屋号は1回だけ検索し、結果を元の行に割り当てる
+                        unique_names = list(dict.fromkeys(store_names))
+                        
+                        # 画面の更新は最大50回程度に間引く（1件ごとの更新はブラウザとの往復が多すぎる）
+                        progress_step = max(1, len(unique_names) // 50)
+                        
+                        def update_progress(done, store_name):
+                            if done % progress_step == 0 or done == len(unique_names):
+                                status_text.text(f"検索中: {done}/{len(unique_names)} - {store_name}")
+                                progress_bar.progress(done / len(unique_names))
+                        
+                        # ▼ 精度向上: location_hint（地名）を渡す
+                        results_map = dict(zip(unique_names, asyncio.run(search_stores_by_name(
+                            unique_names, location_str_csv, api_key, location_hint=location_name, on_result=update_progress
+                        ))))
+                        # ▲ 精度向上ここまで
+                        search_results = [results_map[name] for name in store_names]
+                        
+                        # 中心からの距離を全件まとめて計算（座標がない行は NaN）
+                        distances = np.full(len(search_results), np.nan)
+                        outside = np.zeros(len(search_results), dtype=bool)
+                        if use_radius_csv and radius_meters_csv and center_lat_csv and center_lon_csv:
+                            lat_arr = np.asarray([r.get('緯度') or np.nan for r in search_results], dtype=np.float64)
+                            lon_arr = np.asarray([r.get('経度') or np.nan for r in search_results], dtype=np.float64)
+                            distances = haversine_m_vec(center_lat_csv, center_lon_csv, lat_arr, lon_arr)
+                            outside = distances > radius_meters_csv
+                        
+                        for store_name, result, distance_text, is_outside in zip(store_names, search_results, format_distances(distances).tolist(), outside):
                             row_result = {
                                 '屋号（入力値）': store_name,
                                 '取得店舗名': result.get('店舗名', ''),
@@ -1034,77 +1420,49 @@ with tab_csv:
                                 '評価': result.get('評価', ''),
                                 'レビュー数': result.get('レビュー数', ''),
                                 '信頼度': result.get('信頼度', 'Low'),
-                                'エラー': result.get('error', '') if not result.get('success', False) else ''
+                                'エラー': result.get('error', '') if not result.get('success', False) else '',
+                                '距離（m）': distance_text
                             }
                             
-                            if use_radius_csv and radius_meters_csv and center_lat_csv and center_lon_csv:
-                                lat = result.get('緯度')
-                                lon = result.get('経度')
-                                if lat and lon:
-                                    distance = calculate_distance(center_lat_csv, center_lon_csv, lat, lon)
-                                    row_result['距離（m）'] = f"{distance:.0f}"
-                                    if distance > radius_meters_csv:
-                                        row_result['取得店舗名'] = ''
-                                        row_result['電話番号'] = ''
-                                        row_result['住所'] = ''
-                                        row_result['エラー'] = f'半径{radius_meters_csv}mを超えています'
-                                else:
-                                    row_result['距離（m）'] = ''
-                            else:
-                                row_result['距離（m）'] = ''
+                            if is_outside:
+                                row_result['取得店舗名'] = ''
+                                row_result['電話番号'] = ''
+                                row_result['住所'] = ''
+                                row_result['エラー'] = f'半径{radius_meters_csv}mを超えています'
                             
                             results_list.append(row_result)
-                            time.sleep(0.5)
                         
                         progress_bar.progress(1.0)
                         status_text.empty()
                         
                         if results_list:
-                            df_results = pd.DataFrame(results_list)
+                            # 列の順序と型を明示して一括で DataFrame を作る（空欄の座標・レビュー数は欠損値にする）
+                            df_results = pd.DataFrame.from_records(results_list, columns=CSV_RESULT_COLUMNS)
+                            numeric_cols = ['緯度', '経度', 'レビュー数']
+                            df_results[numeric_cols] = df_results[numeric_cols].apply(pd.to_numeric, errors='coerce')
+                            df_results = df_results.astype({'緯度': 'float64', '経度': 'float64', 'レビュー数': 'Int64'})
                             
                             st.success(f"✅ {len(results_list)}件の検索が完了しました！")
                             
                             tab_result1, tab_result2, tab_result3 = st.tabs(["📊 テーブル表示", "📋 リスト表示", "📥 CSVダウンロード"])
                             
                             with tab_result1:
-                                st.dataframe(df_results, use_container_width=True, hide_index=True)
+                                show_result_table(df_results, len(df_results), key="show_all_csv_results")
                             
                             with tab_result2:
-                                for index, row in enumerate(results_list, 1):
-                                    with st.container():
-                                        st.markdown(f"### {index}. {row['屋号（入力値）']}")
-                                        if row['取得店舗名']:
-                                            st.markdown(f"**取得店舗名:** {row['取得店舗名']}")
-                                        if row['電話番号']:
-                                            st.markdown(f"📞 **電話番号:** {row['電話番号']}")
-                                        if row['住所']:
-                                            st.markdown(f"📍 **住所:** {row['住所']}")
-                                        if row.get('距離（m）'):
-                                            st.markdown(f"📏 **距離:** {row['距離（m）']}m")
-                                        confidence = row.get('信頼度', 'Low')
-                                        confidence_emoji = {
-                                            'Very High': '🟢',
-                                            'High': '🟡',
-                                            'Mid': '🟠',
-                                            'Low': '🔴'
-                                        }.get(confidence, '⚪')
-                                        st.markdown(f"{confidence_emoji} **信頼度:** {confidence}")
-                                        if row['エラー']:
-                                            st.warning(f"⚠️ {row['エラー']}")
-                                        st.divider()
+                                st.markdown("\n\n---\n\n".join(_iter_csv_result_markdown(results_list)))
                             
                             with tab_result3:
                                 st.markdown("### CSVファイルをダウンロード")
-                                csv_output = df_results.to_csv(index=False, encoding='utf-8-sig')
                                 st.download_button(
                                     label="📥 CSVファイルをダウンロード",
-                                    data=csv_output,
+                                    data=_to_csv_bytes(df_results),
                                     file_name=f"phone_numbers_from_csv_{len(results_list)}件.csv",
                                     mime="text/csv",
                                     use_container_width=True
                                 )
-                                st.markdown("#### プレビュー")
-                                st.dataframe(df_results, use_container_width=True, hide_index=True)
+                                st.caption("プレビュー (先頭20件)")
+                                st.table(df_results.head(20))
         
         except Exception as e:
             st.error(f"❌ エラーが発生しました: {str(e)}")
@@ -1,8 +1,14 @@
 import os
 import sys
+import csv
 from dotenv import load_dotenv
 from serpapi import GoogleSearch
 
+# 項目が取得できなかった場合の表示
+DEFAULT_TITLE = 'タイトル不明'
+DEFAULT_PHONE = '電話番号なし'
+DEFAULT_ADDRESS = '住所不明'
+
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
@@ -33,19 +39,14 @@ search = GoogleSearch(params)
 results = search.get_dict()
 
 # 電話番号を抽出してリスト化
-phone_numbers = []
-
-if results and 'local_results' in results:
-    for place in results['local_results']:
-        title = place.get('title', 'タイトル不明')
-        phone = place.get('phone') or place.get('電話', '電話番号なし')
-        address = place.get('address') or place.get('住所', '住所不明')
-        
-        phone_numbers.append({
-            'title': title,
-            'phone': phone,
-            'address': address
-        })
+phone_numbers = [
+    {
+        'title': place.get('title', DEFAULT_TITLE),
+        'phone': place.get('phone') or place.get('電話', DEFAULT_PHONE),
+        'address': place.get('address') or place.get('住所', DEFAULT_ADDRESS)
+    }
+    for place in (results or {}).get('local_results', [])
+]
 
 # 結果を表示
 print("\n=== 検索結果: 電話番号リスト ===\n")
@@ -57,23 +58,26 @@ if not phone_numbers:
     if results:
         print(f"検索結果のキー: {list(results.keys())}")
 else:
-    for index, place in enumerate(phone_numbers, 1):
-        print(f"{index}. {place['title']}")
-        print(f"   電話番号: {place['phone']}")
-        print(f"   住所: {place['address']}")
-        print("")
+    # 1件ずつprintせず、まとめて1回で書き出す
+    sys.stdout.write("".join(
+        f"{index}. {place['title']}\n"
+        f"   電話番号: {place['phone']}\n"
+        f"   住所: {place['address']}\n"
+        "\n"
+        for index, place in enumerate(phone_numbers, 1)
+    ))
     
     # 電話番号のみのリストも表示
     print("\n=== 電話番号のみのリスト ===\n")
-    for index, place in enumerate(phone_numbers, 1):
-        print(f"{index}. {place['phone']}")
+    sys.stdout.write("".join(f"{index}. {place['phone']}\n" for index, place in enumerate(phone_numbers, 1)))
 
 # CSV形式でも出力（オプション）
 if len(sys.argv) > 3 and (sys.argv[3] == '--csv' or sys.argv[3] == '-c'):
     print("\n=== CSV形式 ===\n")
-    print("店舗名,電話番号,住所")
-    for place in phone_numbers:
-        print(f"\"{place['title']}\",\"{place['phone']}\",\"{place['address']}\"")
+    # 改行コードは標準出力側で変換されるため、CSVの行末は '\n' にする
+    writer = csv.writer(sys.stdout, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(['店舗名', '電話番号', '住所'])
+    writer.writerows((place['title'], place['phone'], place['address']) for place in phone_numbers)
 
 
 